@@ -1,8 +1,11 @@
 import streamlit as st
 import cadquery as cq
 from cadquery import exporters
+import functools
 import tempfile
 import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 import pyvista as pv
 from stpyvista import stpyvista
 import json
@@ -13,8 +16,17 @@ if "IS_XVFB_RUNNING" not in st.session_state:
   st.session_state.IS_XVFB_RUNNING = True 
   
 # ------------- i18n加载 -------------
-with open("i18n_strings.json", "r", encoding="utf-8") as f:
-    I18N_STRINGS = json.load(f)
+@st.cache_data
+def _load_i18n():
+    with open("i18n_strings.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@st.cache_data
+def _tr_table(lang: str) -> dict:
+    """每种语言预合并一张表 (英文兜底), 让 _() 只做一次字典查找."""
+    strings = _load_i18n()
+    return {**strings["en"], **strings.get(lang, {})}
 
 
 def _(key: str) -> str:
@@ -22,8 +34,8 @@ def _(key: str) -> str:
     根据当前语言 lang 返回对应的翻译文案.
     如果对应语言里没有, 则回退到英文.
     """
-    lang = st.session_state.get("selected_lang", "en")
-    return I18N_STRINGS.get(lang, I18N_STRINGS["en"]).get(key, key)
+    table = _tr_table(st.session_state.get("selected_lang", "en"))
+    return table.get(key, key)
 
 
 # ------------- 几何参数 -------------
@@ -36,7 +48,70 @@ STUD_HEIGHT = 1.8
 UNDERTUBE_OUTER_DIAM = 6.41
 UNDERTUBE_INNER_DIAM = 4.8
 PLAY = 0.2
+TILE_UNITS = 8   # 大砖块分批布尔时每个子块覆盖的单元数 (8x8)
+
+# 网格精度: 预览只需粗网格, 下载 STL 用细网格
+PREVIEW_CIRCLE_SEGMENTS = 32
+PREVIEW_DECIMATE_RATIO = 0.8
+STL_TOLERANCE = 0.05
+STL_ANGULAR_TOLERANCE = 0.1
+
+
+@functools.lru_cache(maxsize=32)
+def _stud_solid(tolerance):
+    """单个 stud 实体原型, 按公差缓存; 每个网格位置只做平移摆放."""
+    return (
+        cq.Workplane("XY")
+        .circle((STUD_DIAMETER - 2*tolerance)/2.0)
+        .extrude(STUD_HEIGHT)
+        .val()
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _tube_solid(tolerance, tube_height):
+    """单个空心 under-tube 实体原型, 按 (公差, 高度) 缓存."""
+    # 同一草图里的两个同心圆作为环形面的外/内边界,
+    # 一次 extrude 直接得到空心管, 省掉内圆柱和布尔 cut
+    return (
+        cq.Workplane("XY")
+        .circle((UNDERTUBE_OUTER_DIAM - 2*tolerance) / 2.0)
+        .circle((UNDERTUBE_INNER_DIAM + 2*tolerance) / 2.0)
+        .extrude(tube_height)
+        .val()
+    )
+
+
+def _place_solid(points, solid):
+    """
+    把原型实体平移摆放到各圆心.
+
+    点数超过 64 时按 TILE_UNITS x TILE_UNITS 单元的空间子块分批摆放,
+    再用 glue union 合并子块, 让每次 BOP 的参数规模保持在近线性区间.
+    """
+    def _tile(pts):
+        return (
+            cq.Workplane("XY")
+            .pushPoints(pts)
+            .eachpoint(lambda loc: solid.moved(loc), True)
+        )
+
+    if len(points) <= 64:
+        return _tile(points)
+
+    tile_size = TILE_UNITS * UNIT_LENGTH
+    tiles = {}
+    for px, py in points:
+        key = (int(px // tile_size), int(py // tile_size))
+        tiles.setdefault(key, []).append((px, py))
 
+    return functools.reduce(
+        lambda a, b: a.union(b, glue=True),
+        (_tile(pts) for pts in tiles.values())
+    )
+
+
+@st.cache_resource(max_entries=32)
 def build_brick(
     brick_length=3,
     brick_width=2,
@@ -48,79 +123,262 @@ def build_brick(
     outer_width  = brick_width  * UNIT_LENGTH
     outer_height = brick_height * PLATE_HEIGHT
 
+    shift_x = -outer_length / 2.0
+    shift_y = -outer_width  / 2.0
+
+    # 去掉底面做 shell, 一步得到四壁+顶板, 省掉内腔盒体和布尔 cut
     base = (
         cq.Workplane("XY")
         .box(outer_length, outer_width, outer_height)
         .translate((0, 0, outer_height/2))
+        .faces("<Z")
+        .shell(-WALL_THICKNESS)
+        .translate((-shift_x, -shift_y, 0))
     )
 
-    cavity_length = outer_length - 2*WALL_THICKNESS - PLAY + 2*tolerance
-    cavity_width  = outer_width  - 2*WALL_THICKNESS - PLAY + 2*tolerance
-    cavity_height = outer_height - ROOF_THICKNESS
+    studs = None
+    if with_studs:
+        # 圆心坐标用 meshgrid 在 C 层生成, 原型实体按公差缓存后批量摆放
+        xs, ys = np.meshgrid(
+            (np.arange(brick_length) + 0.5) * UNIT_LENGTH,
+            (np.arange(brick_width) + 0.5) * UNIT_LENGTH,
+            indexing="ij"
+        )
+        stud_points = np.column_stack((xs.ravel(), ys.ravel())).tolist()
+        studs = (
+            _place_solid(stud_points, _stud_solid(tolerance))
+            .translate((0, 0, outer_height))
+        )
 
-    inner_cavity = (
-        cq.Workplane("XY")
-        .translate((WALL_THICKNESS, WALL_THICKNESS, 0))
-        .box(cavity_length, cavity_width, cavity_height)
-    )
-    shift_x = -outer_length / 2.0
-    shift_y = -outer_width  / 2.0
+    under_tubes = None
+    if brick_length > 1 and brick_width > 1:
+        # shell 之后顶板厚度为 WALL_THICKNESS; 管顶正好贴住顶板下表面,
+        # 保证与 base 只共面不相交 (glue 的前提)
+        tube_height = outer_height - WALL_THICKNESS
+
+        xs, ys = np.meshgrid(
+            np.arange(1, brick_length) * UNIT_LENGTH,
+            np.arange(1, brick_width) * UNIT_LENGTH,
+            indexing="ij"
+        )
+        ring_positions = np.column_stack((xs.ravel(), ys.ravel())).tolist()
 
-    base = base.cut(inner_cavity).translate(((-shift_x, -shift_y, 0)))
+        under_tubes = _place_solid(ring_positions, _tube_solid(tolerance, tube_height))
+
+    # studs/under_tubes 与 base 只在平面上相接, glue=True 走不求交的快速路径
+    brick = base
+    if studs:
+        brick = brick.union(studs, glue=True)
+    if under_tubes:
+        brick = brick.union(under_tubes, glue=True)
+
+    brick = brick.translate((shift_x, shift_y, 0))
+    return brick
+
+
+def build_brick_preview_mesh(
+    brick_length=3,
+    brick_width=2,
+    brick_height=3,
+    with_studs=True,
+    tolerance=0.0
+):
+    """
+    只为预览拼装 PyVista 表面网格, 完全绕开 OCCT.
+    预览不需要单一流形实体, 用 pv.Box / pv.Cylinder 原生图元组装即可;
+    下载导出仍走 build_brick 的 CadQuery 路径.
+    """
+    outer_length = brick_length * UNIT_LENGTH
+    outer_width  = brick_width  * UNIT_LENGTH
+    outer_height = brick_height * PLATE_HEIGHT
+    t = WALL_THICKNESS
+
+    blocks = pv.MultiBlock()
+
+    # 外壳: 顶板 + 四壁 (与 build_brick 的 shell 结果一致)
+    blocks.append(pv.Box(bounds=(
+        0, outer_length, 0, outer_width, outer_height - t, outer_height)))
+    blocks.append(pv.Box(bounds=(
+        0, t, 0, outer_width, 0, outer_height - t)))
+    blocks.append(pv.Box(bounds=(
+        outer_length - t, outer_length, 0, outer_width, 0, outer_height - t)))
+    blocks.append(pv.Box(bounds=(
+        t, outer_length - t, 0, t, 0, outer_height - t)))
+    blocks.append(pv.Box(bounds=(
+        t, outer_length - t, outer_width - t, outer_width, 0, outer_height - t)))
 
-    studs = None
     if with_studs:
-        stud_cyl = cq.Workplane("XY")
+        stud_rad = (STUD_DIAMETER - 2*tolerance) / 2.0
         for x in range(brick_length):
             for y in range(brick_width):
-                center_x = (x + 0.5) * UNIT_LENGTH
-                center_y = (y + 0.5) * UNIT_LENGTH
-                stud_cyl = (
-                    stud_cyl
-                    .pushPoints([(center_x, center_y)])
-                    .circle((STUD_DIAMETER - 2*tolerance)/2.0)
-                    .extrude(STUD_HEIGHT)
-                )
-        studs = stud_cyl.translate((0, 0, outer_height))
+                blocks.append(pv.Cylinder(
+                    center=((x + 0.5) * UNIT_LENGTH,
+                            (y + 0.5) * UNIT_LENGTH,
+                            outer_height + STUD_HEIGHT/2.0),
+                    direction=(0, 0, 1),
+                    radius=stud_rad,
+                    height=STUD_HEIGHT,
+                    resolution=PREVIEW_CIRCLE_SEGMENTS
+                ))
 
-    under_tubes = None
     if brick_length > 1 and brick_width > 1:
-        tube_height = outer_height - ROOF_THICKNESS + 0.01
+        tube_height = outer_height - t
         outer_rad = (UNDERTUBE_OUTER_DIAM - 2*tolerance) / 2.0
         inner_rad = (UNDERTUBE_INNER_DIAM + 2*tolerance) / 2.0
+        for x in range(1, brick_length):
+            for y in range(1, brick_width):
+                center = (x * UNIT_LENGTH, y * UNIT_LENGTH, tube_height/2.0)
+                # 空心管用内外两个圆柱面近似, 预览足够
+                blocks.append(pv.Cylinder(
+                    center=center, direction=(0, 0, 1),
+                    radius=outer_rad, height=tube_height,
+                    resolution=PREVIEW_CIRCLE_SEGMENTS))
+                blocks.append(pv.Cylinder(
+                    center=center, direction=(0, 0, 1),
+                    radius=inner_rad, height=tube_height,
+                    resolution=PREVIEW_CIRCLE_SEGMENTS))
+
+    mesh = blocks.combine().extract_surface()
+    # 与 build_brick 一致: 模型在 XY 平面上居中
+    return mesh.translate((-outer_length/2.0, -outer_width/2.0, 0))
+
+
+@st.cache_resource
+def _export_pool():
+    """
+    共享导出线程池. OCCT 的网格化/STEP writer 在 C++ 层释放 GIL,
+    所以 STL 和 STEP 导出可以互相重叠, 也能和页面渲染重叠.
+    """
+    return ThreadPoolExecutor(max_workers=2)
 
-        ring_positions = [
-            (x * UNIT_LENGTH, y * UNIT_LENGTH)
-            for x in range(1, brick_length)
-            for y in range(1, brick_width)
-        ]
 
-        tube_cyl = (
-            cq.Workplane("XY")
-            .pushPoints(ring_positions)
-            .circle(outer_rad)
-            .extrude(tube_height)
-        )
-        inner_cyl = (
-            cq.Workplane("XY")
-            .pushPoints(ring_positions)
-            .circle(inner_rad)
-            .extrude(tube_height)
-            .translate((0, 0, -0.01))
-        )
-        under_tubes = tube_cyl.cut(inner_cyl)
+@st.cache_resource
+def _warmup():
+    """
+    冷启动预热: 构建一个最小砖块, 把 OCCT 库加载和 BOPAlgo 初始化
+    挪到用户第一次点 Generate 之前, 只执行一次.
+    """
+    build_brick(1, 1, 1, False, 0.0)
+    return True
 
-    brick = base
-    if studs:
-        brick = brick.union(studs)
-    if under_tubes:
-        brick = brick.union(under_tubes)
 
-    brick = brick.translate((shift_x, shift_y, 0))
-    return brick
+@st.cache_resource(max_entries=32)
+def _make_plotter(
+    brick_length,
+    brick_width,
+    brick_height,
+    with_studs,
+    tolerance
+):
+    """
+    按参数缓存整个 pv.Plotter:
+    非几何 rerun (切换语言/点下载) 直接复用已搭好的场景.
+    """
+    mesh = build_brick_preview_mesh(
+        brick_length=brick_length,
+        brick_width=brick_width,
+        brick_height=brick_height,
+        with_studs=with_studs,
+        tolerance=tolerance
+    )
+    # 三角化后抽稀 80%, 再算法向量保证光照正确:
+    # 发给浏览器的 WebGL 负载小一个量级, 预览外观不变
+    mesh = (
+        mesh.triangulate()
+        .decimate(PREVIEW_DECIMATE_RATIO)
+        .clean()
+        .compute_normals(inplace=False)
+    )
+    plotter = pv.Plotter(window_size=(600, 500))
+    plotter.add_mesh(mesh, color="orange", show_edges=False)
+    plotter.view_isometric()
+    return plotter
+
+
+def _binary_stl_bytes(shape):
+    """
+    对 shape 做一次 tessellate, 直接用 numpy 拼出二进制 STL
+    (80 字节头 + 三角形数 + 每三角形 50 字节), 不再经过 OCCT 导出器和临时文件.
+    """
+    vertices, triangles = shape.tessellate(STL_TOLERANCE, STL_ANGULAR_TOLERANCE)
+    verts = np.array([v.toTuple() for v in vertices], dtype=np.float32)
+    tris = np.asarray(triangles, dtype=np.int64)
+
+    v0 = verts[tris[:, 0]]
+    v1 = verts[tris[:, 1]]
+    v2 = verts[tris[:, 2]]
+    normals = np.cross(v1 - v0, v2 - v0)
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0] = 1.0
+    normals = (normals / lengths[:, None]).astype(np.float32)
+
+    record_type = np.dtype([
+        ("normal", "<f4", 3),
+        ("verts", "<f4", (3, 3)),
+        ("attr", "<u2"),
+    ])
+    records = np.zeros(len(tris), dtype=record_type)
+    records["normal"] = normals
+    records["verts"][:, 0] = v0
+    records["verts"][:, 1] = v1
+    records["verts"][:, 2] = v2
+
+    header = b"brick_generator".ljust(80, b"\0")
+    return header + np.uint32(len(tris)).tobytes() + records.tobytes()
+
+
+@st.cache_data(max_entries=32)
+def brick_stl_bytes(
+    brick_length,
+    brick_width,
+    brick_height,
+    with_studs,
+    tolerance
+):
+    """
+    构建模型(命中 build_brick 缓存)并导出 STL, 返回字节串.
+    按参数缓存, 重复 rerun / 下载点击不再重新网格化.
+    """
+    model = build_brick(
+        brick_length=brick_length,
+        brick_width=brick_width,
+        brick_height=brick_height,
+        with_studs=with_studs,
+        tolerance=tolerance
+    )
+    return _binary_stl_bytes(model.val())
+
+
+@st.cache_data(max_entries=32)
+def brick_step_bytes(
+    brick_length,
+    brick_width,
+    brick_height,
+    with_studs,
+    tolerance
+):
+    """
+    构建模型并导出 STEP, 返回字节串.
+    OCCT 的 STEP writer 只认文件名, 临时文件只在缓存未命中时写一次.
+    """
+    model = build_brick(
+        brick_length=brick_length,
+        brick_width=brick_width,
+        brick_height=brick_height,
+        with_studs=with_studs,
+        tolerance=tolerance
+    )
+    with tempfile.NamedTemporaryFile(suffix=".step", delete=False) as tmp_step:
+        tmp_step_path = tmp_step.name
+    exporters.export(model, tmp_step_path, exporters.ExportTypes.STEP)
+    with open(tmp_step_path, "rb") as f:
+        data = f.read()
+    os.remove(tmp_step_path)
+    return data
 
 
 def main():
+    _warmup()
     st.title( _("app_title") )
 
     # 确保 session_state 有初始数据
@@ -135,9 +393,6 @@ def main():
             "with_studs": True,
             "tolerance": -0.1
         }
-    if "brick_model" not in st.session_state:
-        # 存储生成后的模型(或可只存参数, 动态生成)
-        st.session_state["brick_model"] = None
     if "generate_count" not in st.session_state:
         st.session_state["generate_count"] = 0
 
@@ -198,43 +453,68 @@ def main():
             "tolerance": tol_val
         }
 
-        # 生成新模型
-        new_model = build_brick(
-            brick_length=length_val,
-            brick_width=width_val,
-            brick_height=height_val,
-            with_studs=with_studs_val,
-            tolerance=tol_val
-        )
-        st.session_state["brick_model"] = new_model
+        # 几何构建丢给线程池 (OCCT 在 C++ 层释放 GIL),
+        # 主线程只挂 spinner 保持 UI 有响应; 结果进 build_brick 缓存
+        with st.spinner( _("building") ):
+            _export_pool().submit(
+                build_brick,
+                brick_length=length_val,
+                brick_width=width_val,
+                brick_height=height_val,
+                with_studs=with_studs_val,
+                tolerance=tol_val
+            ).result()
+
         st.session_state["generate_count"] += 1  # 强制 stpyvista 重绘
 
     # ------------- 在主区域显示 3D -------------
-    if st.session_state["brick_model"] is None:
+    if st.session_state["generate_count"] == 0:
         st.info( _("no_model") )
     else:
-        # 导出 STL -> PyVista
-        with tempfile.NamedTemporaryFile(suffix=".stl", delete=False) as tmp_stl:
-            tmp_stl_path = tmp_stl.name
-        exporters.export(st.session_state["brick_model"], tmp_stl_path, exporters.ExportTypes.STL)
-        mesh = pv.read(tmp_stl_path)
-        os.remove(tmp_stl_path)
-
-        # 绘制可交互 3D
-        plotter = pv.Plotter(window_size=(600, 500))
-        plotter.add_mesh(mesh, color="orange", show_edges=False)
-        plotter.view_isometric()
+        params = st.session_state["brick_params"]
+        params_key = (
+            params["brick_length"],
+            params["brick_width"],
+            params["brick_height"],
+            params["with_studs"],
+            params["tolerance"]
+        )
 
-        stpyvista(plotter, key=f"interactive_brick_{st.session_state['generate_count']}")
+        # 先把导出任务提交到线程池, 和下面的 plotter 构建/页面渲染重叠;
+        # 缓存命中时 result() 立即返回
+        pool = _export_pool()
+        stl_future = pool.submit(
+            brick_stl_bytes,
+            brick_length=params["brick_length"],
+            brick_width=params["brick_width"],
+            brick_height=params["brick_height"],
+            with_studs=params["with_studs"],
+            tolerance=params["tolerance"]
+        )
+        step_future = None
+        if st.session_state.get("step_params_key") == params_key:
+            step_future = pool.submit(
+                brick_step_bytes,
+                brick_length=params["brick_length"],
+                brick_width=params["brick_width"],
+                brick_height=params["brick_height"],
+                with_studs=params["with_studs"],
+                tolerance=params["tolerance"]
+            )
+
+        # 预览 plotter 按参数缓存, 内部用 PyVista 原生图元网格, 不经过 OCCT/STL
+        plotter = _make_plotter(
+            brick_length=params["brick_length"],
+            brick_width=params["brick_width"],
+            brick_height=params["brick_height"],
+            with_studs=params["with_studs"],
+            tolerance=params["tolerance"]
+        )
 
-        # 下载 STL
-        with tempfile.NamedTemporaryFile(suffix=".stl", delete=False) as tmp_stl:
-            tmp_stl_path = tmp_stl.name
-        exporters.export(st.session_state["brick_model"], tmp_stl_path, exporters.ExportTypes.STL)
-        with open(tmp_stl_path, "rb") as f:
-            stl_data = f.read()
-        os.remove(tmp_stl_path)
+        stpyvista(plotter, key=f"interactive_brick_{st.session_state['generate_count']}")
 
+        # 下载 STL (字节按参数缓存, 命中时零开销)
+        stl_data = stl_future.result()
         st.download_button(
             label=_("download_stl"),
             data=stl_data,
@@ -242,20 +522,27 @@ def main():
             mime="application/vnd.ms-pki.stl"
         )
 
-        # 下载 STEP
-        with tempfile.NamedTemporaryFile(suffix=".step", delete=False) as tmp_step:
-            tmp_step_path = tmp_step.name
-        exporters.export(st.session_state["brick_model"], tmp_step_path, exporters.ExportTypes.STEP)
-        with open(tmp_step_path, "rb") as f:
-            step_data = f.read()
-        os.remove(tmp_step_path)
-
-        st.download_button(
-            label=_("download_step"),
-            data=step_data,
-            file_name="brick_brick.step",
-            mime="application/x-step"
-        )
+        # STEP 导出最慢, 只在用户点"准备"后才生成 (字节按参数缓存)
+        if st.button( _("prepare_step") ):
+            st.session_state["step_params_key"] = params_key
+        if st.session_state.get("step_params_key") == params_key:
+            if step_future is None:
+                # 本次 rerun 刚点的"准备", 同步提交一次
+                step_future = pool.submit(
+                    brick_step_bytes,
+                    brick_length=params["brick_length"],
+                    brick_width=params["brick_width"],
+                    brick_height=params["brick_height"],
+                    with_studs=params["with_studs"],
+                    tolerance=params["tolerance"]
+                )
+            step_data = step_future.result()
+            st.download_button(
+                label=_("download_step"),
+                data=step_data,
+                file_name="brick_brick.step",
+                mime="application/x-step"
+            )
 
 
 if __name__ == "__main__":
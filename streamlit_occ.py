@@ -1,32 +1,63 @@
 import streamlit as st
-import tempfile, os, json
+import tempfile, os, json, uuid, hashlib, pathlib
+import numpy as np
 import pyvista as pv
 from stpyvista import stpyvista
 from stpyvista.utils import start_xvfb
 import sys
+from math import pi
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# 载入 i18n 字符串; orjson 的 C 解析器比纯 Python 的 json 快, 缺席时回退
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-# 载入 i18n 字符串
 @st.cache_data
 def load_i18n():
+    if orjson is not None:
+        with open("i18n_strings.json", "rb") as f:
+            return orjson.loads(f.read())
     with open("i18n_strings.json", "r", encoding="utf-8") as f:
         return json.load(f)
 
 I18N_STRINGS = load_i18n()
 
+@lru_cache(maxsize=4096)
+def _lookup(lang: str, key: str) -> str:
+    """按 (语言, 键) 缓存查找结果, 语言本身在键里, 切换语言无需清缓存."""
+    return I18N_STRINGS.get(lang, I18N_STRINGS["en"]).get(key, key)
+
 def _(key: str) -> str:
     """
     根据当前语言返回对应的翻译文案，
     如果对应语言中没有该翻译，则回退到英文。
     """
-    lang = st.session_state.get("selected_lang", "en")
-    return I18N_STRINGS.get(lang, I18N_STRINGS["en"]).get(key, key)
+    return _lookup(st.session_state.get("selected_lang", "en"), key)
 
 # pythonocc 模块
-from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeBox, BRepPrimAPI_MakeCylinder
+from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeBox, BRepPrimAPI_MakeCylinder, BRepPrimAPI_MakeRevol
 from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Cut, BRepAlgoAPI_Fuse
-from OCC.Core.gp import gp_Pnt, gp_Dir, gp_Ax2, gp_Trsf, gp_Vec
-from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform
+from OCC.Core.gp import gp_Pnt, gp_Dir, gp_Ax1, gp_Ax2, gp_Trsf, gp_Vec
+from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform, BRepBuilderAPI_MakePolygon, BRepBuilderAPI_MakeFace
+from OCC.Core.TopTools import TopTools_ListOfShape
+from OCC.Core.BOPAlgo import BOPAlgo_GlueShift
+from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
+from OCC.Core.BRep import BRep_Tool, BRep_Builder
+from OCC.Core.TopExp import TopExp_Explorer
+from OCC.Core.TopAbs import TopAbs_FACE, TopAbs_REVERSED
+from OCC.Core.TopoDS import topods, TopoDS_Compound
+from OCC.Core.TopLoc import TopLoc_Location
 from OCC.Extend.DataExchange import write_stl_file, write_step_file
+from OCC.Core.BOPAlgo import BOPAlgo_Options
+from OCC.Core.OSD import OSD_ThreadPool
+
+# 全局打开 OCCT 并行模式: pave filler 里没被逐个 SetRunParallel
+# 覆盖的环节也能多线程; 默认线程池按本机核数初始化
+BOPAlgo_Options.SetParallelMode_s(True)
+OSD_ThreadPool.DefaultPool_s().Init(os.cpu_count())
 
 # 全局几何参数
 UNIT_LENGTH = 8.0
@@ -39,74 +70,283 @@ UNDERTUBE_OUTER_DIAM = 6.41
 UNDERTUBE_INNER_DIAM = 4.8
 PLAY = 0.2
 
-def build_brick(brick_length=3, brick_width=2, brick_height=3, with_studs=True, tolerance=0.0):
+# 网格偏差: 查看器随模型尺寸取粗偏差 (600×500 窗口分辨不了更细),
+# 下载 STL 用固定细偏差
+VIEWER_DEFLECTION_RATIO = 0.005
+VIEWER_MIN_DEFLECTION = 0.2
+STL_LINEAR_DEFLECTION = 0.05
+STL_ANGULAR_DEFLECTION = 0.5
+
+def _make_tube_annulus(outer_rad, inner_rad, tube_height):
     """
-    用 pythonocc 构造砖块模型：
-      1. 生成外壳盒体；
-      2. 从中减去内腔（内盒）；
-      3. 根据参数添加顶部的圆柱 stud 以及底部的 under-tube（内部管）；
-      4. 最后将整体平移使模型中心位于原点。
+    用 XZ 平面上的矩形截面绕 Z 轴旋转一周直接得到空心圆柱,
+    替代"外圆柱减内圆柱"的逐管布尔 cut.
+    """
+    profile = BRepBuilderAPI_MakePolygon()
+    profile.Add(gp_Pnt(inner_rad, 0, 0))
+    profile.Add(gp_Pnt(outer_rad, 0, 0))
+    profile.Add(gp_Pnt(outer_rad, 0, tube_height))
+    profile.Add(gp_Pnt(inner_rad, 0, tube_height))
+    profile.Close()
+    face = BRepBuilderAPI_MakeFace(profile.Wire()).Face()
+    axis = gp_Ax1(gp_Pnt(0, 0, 0), gp_Dir(0, 0, 1))
+    return BRepPrimAPI_MakeRevol(face, axis, 2*pi).Shape()
+
+
+def shape_to_polydata(shape, linear_deflection=0.2, angular_deflection=0.5):
+    """
+    把 OCCT 的三角化结果直接灌进 pyvista.PolyData,
+    跳过"写 STL 临时文件再 pv.read 读回"的两次磁盘往返.
+    """
+    BRepMesh_IncrementalMesh(shape, linear_deflection, False, angular_deflection, True)
+
+    all_verts = []
+    all_faces = []
+    offset = 0
+    exp = TopExp_Explorer(shape, TopAbs_FACE)
+    while exp.More():
+        face = topods.Face(exp.Current())
+        loc = TopLoc_Location()
+        tri = BRep_Tool.Triangulation(face, loc)
+        if tri is not None:
+            trsf = loc.Transformation()
+            n_nodes = tri.NbNodes()
+            verts = np.empty((n_nodes, 3))
+            for k in range(1, n_nodes + 1):
+                p = tri.Node(k).Transformed(trsf)
+                verts[k - 1] = (p.X(), p.Y(), p.Z())
+
+            reversed_face = face.Orientation() == TopAbs_REVERSED
+            n_tris = tri.NbTriangles()
+            # 每行: [3, ia, ib, ic] —— PyVista 的多边形面头部格式
+            faces = np.empty((n_tris, 4), dtype=np.int64)
+            for k in range(1, n_tris + 1):
+                ia, ib, ic = tri.Triangle(k).Get()
+                if reversed_face:
+                    ia, ic = ic, ia
+                faces[k - 1] = (3, offset + ia - 1, offset + ib - 1, offset + ic - 1)
+
+            all_verts.append(verts)
+            all_faces.append(faces)
+            offset += n_nodes
+        exp.Next()
+
+    points = np.vstack(all_verts)
+    faces = np.vstack(all_faces)
+
+    # 面与面交界处的节点在各面三角化里重复出现,
+    # 用 np.unique 去重并重映射索引, 顶点缓冲直接减半左右
+    uniq, inverse = np.unique(points.round(6), axis=0, return_inverse=True)
+    faces[:, 1:] = inverse[faces[:, 1:]]
+    return pv.PolyData(uniq, faces.ravel())
+
+
+def _translated_instances(proto, offsets):
+    """
+    把原型实体并发平移摆放到各 (x, y) 偏移处.
+    BRepBuilderAPI_Transform 在 C++ 层释放 GIL, 线程池能真正并行.
+    """
+    def _place(offset):
+        trsf = gp_Trsf()
+        trsf.SetTranslation(gp_Vec(offset[0], offset[1], 0))
+        return BRepBuilderAPI_Transform(proto, trsf, False).Shape()
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+        return list(ex.map(_place, offsets))
+
+
+def _batch_fuse(base_shape, tools, glue=BOPAlgo_GlueShift):
+    """
+    把 tools 里的所有 shape 一次性融合进 base_shape.
+    默认启用 GlueShift (部件间只共面不相交时的免求交快速路径),
+    若 glue 前提不满足导致报错, 自动退回普通融合.
+    """
+    args = TopTools_ListOfShape()
+    args.Append(base_shape)
+
+    mk_fuse = BRepAlgoAPI_Fuse()
+    mk_fuse.SetArguments(args)
+    mk_fuse.SetTools(tools)
+    mk_fuse.SetRunParallel(True)
+    mk_fuse.SetToFillHistory(False)
+    if glue is not None:
+        mk_fuse.SetGlue(glue)
+        mk_fuse.SetFuzzyValue(1e-6)
+    mk_fuse.Build()
+
+    if glue is not None and mk_fuse.HasErrors():
+        return _batch_fuse(base_shape, tools, glue=None)
+    return mk_fuse.Shape()
+
+
+def _brick_parts(brick_length=3, brick_width=2, brick_height=3, with_studs=True, tolerance=0.0):
+    """
+    构造全部部件 (未融合, 未平移居中), 返回 (部件列表, (外长, 外宽)),
+    列表依次为顶板、四面墙、studs、under-tubes.
+    下载路径把部件融合成单一实体; 预览路径直接拼 Compound, 跳过融合.
     """
     outer_length = brick_length * UNIT_LENGTH
     outer_width  = brick_width  * UNIT_LENGTH
     outer_height = brick_height * PLATE_HEIGHT
 
-    # 生成外壳盒体（底部在 z=0）
-    base_box = BRepPrimAPI_MakeBox(gp_Pnt(0, 0, 0), gp_Pnt(outer_length, outer_width, outer_height)).Shape()
-
     # 内腔尺寸（根据墙厚、顶板厚度及 PLAY 调整）
     cavity_length = outer_length - 2*WALL_THICKNESS - PLAY + 2*tolerance
     cavity_width  = outer_width  - 2*WALL_THICKNESS - PLAY + 2*tolerance
     cavity_height = outer_height - ROOF_THICKNESS
-    cavity_box = BRepPrimAPI_MakeBox(gp_Pnt(WALL_THICKNESS, WALL_THICKNESS, 0),
-                                     gp_Pnt(WALL_THICKNESS + cavity_length, WALL_THICKNESS + cavity_width, cavity_height)).Shape()
 
-    # 从外壳中减去内腔
-    brick_shape = BRepAlgoAPI_Cut(base_box, cavity_box).Shape()
+    # 壳体不再做 outer-minus-inner 的布尔 cut, 而是直接拼出
+    # 顶板 + 四面墙共五个盒体; 它们彼此只共享平面, 满足 glue 前提
+    x0, x1 = WALL_THICKNESS, WALL_THICKNESS + cavity_length
+    y0, y1 = WALL_THICKNESS, WALL_THICKNESS + cavity_width
+    parts = [
+        BRepPrimAPI_MakeBox(gp_Pnt(0, 0, cavity_height),
+                            gp_Pnt(outer_length, outer_width, outer_height)).Shape(),
+        BRepPrimAPI_MakeBox(gp_Pnt(0, 0, 0),
+                            gp_Pnt(x0, outer_width, cavity_height)).Shape(),
+        BRepPrimAPI_MakeBox(gp_Pnt(x1, 0, 0),
+                            gp_Pnt(outer_length, outer_width, cavity_height)).Shape(),
+        BRepPrimAPI_MakeBox(gp_Pnt(x0, 0, 0),
+                            gp_Pnt(x1, y0, cavity_height)).Shape(),
+        BRepPrimAPI_MakeBox(gp_Pnt(x0, y1, 0),
+                            gp_Pnt(x1, outer_width, cavity_height)).Shape(),
+    ]
 
-    # 添加顶部 studs
+    # 顶部 studs: 原型只建一次, 各位置仅平移摆放;
+    # copy=False 让实例共享底层几何, 省掉重复分配
     if with_studs:
-        for i in range(brick_length):
-            for j in range(brick_width):
-                center_x = (i + 0.5) * UNIT_LENGTH
-                center_y = (j + 0.5) * UNIT_LENGTH
-                stud_radius = (STUD_DIAMETER - 2*tolerance) / 2.0
-                stud = BRepPrimAPI_MakeCylinder(
-                    gp_Ax2(gp_Pnt(center_x, center_y, outer_height), gp_Dir(0, 0, 1)),
-                    stud_radius,
-                    STUD_HEIGHT
-                ).Shape()
-                brick_shape = BRepAlgoAPI_Fuse(brick_shape, stud).Shape()
-
-    # 添加底部 under tubes（仅当砖块大于 1×1 时）
+        stud_radius = (STUD_DIAMETER - 2*tolerance) / 2.0
+        stud_proto = BRepPrimAPI_MakeCylinder(
+            gp_Ax2(gp_Pnt(0, 0, outer_height), gp_Dir(0, 0, 1)),
+            stud_radius,
+            STUD_HEIGHT
+        ).Shape()
+        # 圆心坐标用 meshgrid 在 C 层一次生成, 平面数组直接喂给线程池
+        xs, ys = np.meshgrid((np.arange(brick_length) + 0.5) * UNIT_LENGTH,
+                             (np.arange(brick_width) + 0.5) * UNIT_LENGTH,
+                             indexing="ij")
+        stud_offsets = np.column_stack((xs.ravel(), ys.ravel()))
+        parts.extend(_translated_instances(stud_proto, stud_offsets))
+
+    # 底部 under tubes（仅当砖块大于 1×1 时）
     if brick_length > 1 and brick_width > 1:
-        tube_height = outer_height - ROOF_THICKNESS + 0.01
+        # 管顶正好贴住顶板下表面: 只共面不相交, 这是 glue 快速路径的前提
+        tube_height = outer_height - ROOF_THICKNESS
         outer_rad = (UNDERTUBE_OUTER_DIAM - 2*tolerance) / 2.0
         inner_rad = (UNDERTUBE_INNER_DIAM + 2*tolerance) / 2.0
-        for i in range(1, brick_length):
-            for j in range(1, brick_width):
-                pos_x = i * UNIT_LENGTH
-                pos_y = j * UNIT_LENGTH
-                tube_outer = BRepPrimAPI_MakeCylinder(
-                    gp_Ax2(gp_Pnt(pos_x, pos_y, 0), gp_Dir(0, 0, 1)),
-                    outer_rad,
-                    tube_height
-                ).Shape()
-                tube_inner = BRepPrimAPI_MakeCylinder(
-                    gp_Ax2(gp_Pnt(pos_x, pos_y, 0), gp_Dir(0, 0, 1)),
-                    inner_rad,
-                    tube_height
-                ).Shape()
-                tube = BRepAlgoAPI_Cut(tube_outer, tube_inner).Shape()
-                brick_shape = BRepAlgoAPI_Fuse(brick_shape, tube).Shape()
-
-    # 平移模型使中心位于原点
+        tube_proto = _make_tube_annulus(outer_rad, inner_rad, tube_height)
+        xs, ys = np.meshgrid(np.arange(1, brick_length) * UNIT_LENGTH,
+                             np.arange(1, brick_width) * UNIT_LENGTH,
+                             indexing="ij")
+        tube_offsets = np.column_stack((xs.ravel(), ys.ravel()))
+        parts.extend(_translated_instances(tube_proto, tube_offsets))
+
+    return parts, (outer_length, outer_width)
+
+def _center_shape(shape, outer_length, outer_width):
+    """平移模型使中心位于原点."""
     trsf = gp_Trsf()
     trsf.SetTranslation(gp_Vec(-outer_length/2.0, -outer_width/2.0, 0))
-    transformer = BRepBuilderAPI_Transform(brick_shape, trsf, True)
-    brick_shape = transformer.Shape()
+    return BRepBuilderAPI_Transform(shape, trsf, True).Shape()
+
+def build_brick(brick_length=3, brick_width=2, brick_height=3, with_studs=True, tolerance=0.0):
+    """
+    用 pythonocc 构造砖块模型（融合成单一实体, 供 STL/STEP 下载）：
+      1. 用顶板加四面墙五个盒体直接拼出壳体（免去内腔布尔 cut）；
+      2. 根据参数添加顶部的圆柱 stud 以及底部的 under-tube（内部管）；
+      3. 顶板、墙、stud、tube 全部喂进同一次并行 BOP 融合
+         （单个 pave-filler, GlueShift 跳过昂贵的求交）；
+      4. 最后将整体平移使模型中心位于原点。
+    """
+    parts, (outer_length, outer_width) = _brick_parts(
+        brick_length, brick_width, brick_height, with_studs, tolerance)
+
+    fuse_tools = TopTools_ListOfShape()
+    for part in parts[1:]:
+        fuse_tools.Append(part)
+    brick_shape = _batch_fuse(parts[0], fuse_tools)
+
+    return _center_shape(brick_shape, outer_length, outer_width)
+
+def build_brick_preview(brick_length=3, brick_width=2, brick_height=3, with_studs=True, tolerance=0.0):
+    """
+    预览专用: 把壳体和部件拼进一个 TopoDS_Compound, 完全跳过融合 BOP.
+    网格化按面遍历, Compound 与融合后的实体渲染效果一致.
+    """
+    parts, (outer_length, outer_width) = _brick_parts(
+        brick_length, brick_width, brick_height, with_studs, tolerance)
+
+    comp = TopoDS_Compound()
+    builder = BRep_Builder()
+    builder.MakeCompound(comp)
+    for part in parts:
+        builder.Add(comp, part)
+
+    return _center_shape(comp, outer_length, outer_width)
+
+@st.cache_resource(max_entries=32)
+def _build_brick_cached(brick_length, brick_width, brick_height, with_studs, tolerance):
+    """按参数缓存构建结果; TopoDS_Shape 不可 pickle, 所以用 cache_resource."""
+    return build_brick(brick_length, brick_width, brick_height, with_studs, tolerance)
+
+@st.cache_resource(max_entries=32)
+def _build_preview_cached(brick_length, brick_width, brick_height, with_studs, tolerance):
+    """按参数缓存预览 Compound (不融合, 构建远快于 build_brick)."""
+    return build_brick_preview(brick_length, brick_width, brick_height, with_studs, tolerance)
+
+# 跨会话磁盘缓存: 常用砖块尺寸 (2×2×3, 4×2 等) 被反复生成,
+# 导出字节按参数哈希落盘后, 任何用户的重复请求都退化成一次文件读取
+_DISK_CACHE_DIR = pathlib.Path(".brick_cache")
 
-    return brick_shape
+def _disk_cached(suffix, params, produce):
+    """磁盘缓存查找: 命中直接读字节, 未命中调用 produce() 并落盘."""
+    key = hashlib.sha1(repr(params).encode()).hexdigest()
+    path = _DISK_CACHE_DIR / f"{key}{suffix}"
+    if path.exists():
+        return path.read_bytes()
+    data = produce()
+    _DISK_CACHE_DIR.mkdir(exist_ok=True)
+    path.write_bytes(data)
+    return data
+
+@st.cache_data(max_entries=32)
+def _export_stl_bytes(brick_length, brick_width, brick_height, with_studs, tolerance):
+    """导出 STL 返回字节串; 进程内按参数缓存, 进程外走磁盘缓存."""
+    params = (brick_length, brick_width, brick_height, with_studs, tolerance)
+
+    def produce():
+        shape = _build_brick_cached(*params)
+        with tempfile.NamedTemporaryFile(suffix=".stl", delete=False) as tmp_stl:
+            tmp_stl_path = tmp_stl.name
+        write_stl_file(shape, tmp_stl_path,
+                       linear_deflection=STL_LINEAR_DEFLECTION,
+                       angular_deflection=STL_ANGULAR_DEFLECTION)
+        with open(tmp_stl_path, "rb") as f:
+            data = f.read()
+        os.remove(tmp_stl_path)
+        return data
+
+    return _disk_cached(".stl", params, produce)
+
+def _scratch_dir():
+    """优先用 tmpfs (/dev/shm): 纯内存, 避开云容器慢盘的日志型文件系统开销."""
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+@st.cache_data(max_entries=32)
+def _export_step_bytes(brick_length, brick_width, brick_height, with_studs, tolerance):
+    """导出 STEP 返回字节串; 进程内按参数缓存, 进程外走磁盘缓存.
+    OCCT 的 writer 只认文件名, 写进 tmpfs."""
+    params = (brick_length, brick_width, brick_height, with_studs, tolerance)
+
+    def produce():
+        shape = _build_brick_cached(*params)
+        step_path = os.path.join(_scratch_dir(), f"brick_{uuid.uuid4().hex}.step")
+        write_step_file(shape, step_path)
+        with open(step_path, "rb") as f:
+            data = f.read()
+        os.unlink(step_path)
+        return data
+
+    return _disk_cached(".step", params, produce)
 
 def main():
     # 选择语言（放在侧边栏顶部）
@@ -122,8 +362,6 @@ def main():
             "with_studs": True,
             "tolerance": -0.1
         }
-    if "brick_model" not in st.session_state:
-        st.session_state["brick_model"] = None
     if "generate_count" not in st.session_state:
         st.session_state["generate_count"] = 0
 
@@ -147,46 +385,48 @@ def main():
             "with_studs": with_studs_val,
             "tolerance": tol_val
         }
-        model = build_brick(brick_length=length_val,
-                            brick_width=width_val,
-                            brick_height=height_val,
-                            with_studs=with_studs_val,
-                            tolerance=tol_val)
-        st.session_state["brick_model"] = model
         st.session_state["generate_count"] += 1
+        # 参数变了, 丢掉上一组参数的"已准备 STEP"标记
+        if st.session_state.get("step_params_key") != tuple(sorted(st.session_state["brick_params"].items())):
+            st.session_state.pop("step_params_key", None)
 
-    if st.session_state["brick_model"] is None:
+    if st.session_state["generate_count"] == 0:
         st.info(_( "no_model" ))
     else:
-        # 导出 STL 并用 pyvista 显示
-        with tempfile.NamedTemporaryFile(suffix=".stl", delete=False) as tmp_stl:
-            tmp_stl_path = tmp_stl.name
-        write_stl_file(st.session_state["brick_model"], tmp_stl_path)
-        mesh = pv.read(tmp_stl_path)
-        os.remove(tmp_stl_path)
+        params = st.session_state["brick_params"]
+        params_key = tuple(sorted(params.items()))
+
+        # 与参数无关的 rerun（切换语言等）直接复用 session_state 里的
+        # 网格和导出字节, 连缓存查找/网格转换都不再做
+        if st.session_state.get("export_key") != params_key:
+            # 查看器只要 Compound 预览 (免融合); 融合实体留给下载路径
+            preview_shape = _build_preview_cached(**params)
+            # OCCT 三角化结果直接进 PyVista, 查看器路径不再写/读 STL;
+            # 偏差随模型尺寸放大, 三角形数量不随砖块变大而爆炸
+            lin_defl = max(VIEWER_MIN_DEFLECTION,
+                           params["brick_length"] * UNIT_LENGTH * VIEWER_DEFLECTION_RATIO)
+            st.session_state["view_mesh"] = shape_to_polydata(preview_shape, linear_deflection=lin_defl)
+            st.session_state["stl_bytes"] = _export_stl_bytes(**params)
+            st.session_state["export_key"] = params_key
+        mesh = st.session_state["view_mesh"]
 
         plotter = pv.Plotter(window_size=(600, 500))
         plotter.add_mesh(mesh, color="orange", show_edges=False)
         plotter.view_isometric()
-        stpyvista(plotter, key=f"interactive_brick_{st.session_state['generate_count']}")
-
-        # STL 下载按钮
-        with tempfile.NamedTemporaryFile(suffix=".stl", delete=False) as tmp_stl2:
-            tmp_stl_path2 = tmp_stl2.name
-        write_stl_file(st.session_state["brick_model"], tmp_stl_path2)
-        with open(tmp_stl_path2, "rb") as f:
-            stl_data = f.read()
-        os.remove(tmp_stl_path2)
-        st.download_button(_( "download_stl" ), data=stl_data, file_name="brick_brick.stl", mime="application/vnd.ms-pki.stl")
-
-        # STEP 下载按钮
-        with tempfile.NamedTemporaryFile(suffix=".step", delete=False) as tmp_step:
-            tmp_step_path = tmp_step.name
-        write_step_file(st.session_state["brick_model"], tmp_step_path)
-        with open(tmp_step_path, "rb") as f:
-            step_data = f.read()
-        os.remove(tmp_step_path)
-        st.download_button(_( "download_step" ), data=step_data, file_name="brick_brick.step", mime="application/x-step")
+        stpyvista(plotter,
+                  key=f"interactive_brick_{st.session_state['generate_count']}",
+                  use_container_width=True,
+                  panel_kwargs={"orientation_widget": True})
+
+        # STL 下载按钮（字节随 export_key 存在 session_state）
+        st.download_button(_( "download_stl" ), data=st.session_state["stl_bytes"], file_name="brick_brick.stl", mime="application/vnd.ms-pki.stl")
+
+        # STEP 序列化较慢, 只在用户点"准备"后才生成（字节按参数缓存）
+        if st.button(_( "prepare_step" )):
+            st.session_state["step_params_key"] = params_key
+        if st.session_state.get("step_params_key") == params_key:
+            step_data = _export_step_bytes(**params)
+            st.download_button(_( "download_step" ), data=step_data, file_name="brick_brick.step", mime="application/x-step")
 
 if __name__ == "__main__":
     # 启动 Xvfb（若环境需要），仅在非 Windows 环境下调用